@@ -10,6 +10,8 @@ class Feeder():
         speed = 0,
         component_size_x = 0.0,
         component_size_y = 0.0,
+        footprint_size_x = 0.0,
+        footprint_size_y = 0.0,
         head = 1,
         angle_compensation = 0,
         feed_spacing = None,
@@ -35,6 +37,9 @@ class Feeder():
         self.speed = speed
         self.component_size_x = component_size_x
         self.component_size_y = component_size_y
+        # Footprint size for the placement check only, not written in the dpv file
+        self.footprint_size_x = footprint_size_x
+        self.footprint_size_y = footprint_size_y
         self.head = head
         self.angle_compensation = angle_compensation
         self.feed_spacing = feed_spacing
@@ -32,6 +32,8 @@ class PartPlacement():
         self.head = head
         self.x = x
         self.y = y
+        # Position as read from the position file, every job links the components from it
+        self.original_position = (x, y, rotation)
         self.place_component = place_component
         self.check_vacuum = check_vacuum
         self.use_vision = use_vision
@@ -1,2 +1,3 @@
+from .version import __version__
 
 from .convert import set_args_parser, main
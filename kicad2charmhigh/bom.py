@@ -0,0 +1,95 @@
+import math
+from collections import OrderedDict
+
+import pyexcel
+
+
+BOM_HEADER = ['Component', 'Value', 'Footprint', 'Quantity per Board', 'Status', 'Jobs', 'Feeders', 'Designators', 'Reel Quantity']
+
+
+class BomLine():
+    """One line of the BOM: all the placements of a given component."""
+    def __init__(self,
+        name,
+        value = None,
+        footprint = None
+        ):
+
+        self.name = name
+        self.value = value
+        self.footprint = footprint
+        self.designators = []
+        # Ordered sets (dict keys) of the jobs and feeders this component goes to
+        self.jobs = OrderedDict()
+        self.feeder_IDs = OrderedDict()
+        self.status = None
+
+    def quantity(self):
+        return len(self.designators)
+
+    def reel_quantity(self, board_quantity=1, attrition=0.0):
+        # Number of components to pull from the stockroom, attrition is a ratio (0.05 = 5%)
+        return int(math.ceil(self.quantity() * board_quantity * (1 + attrition)))
+
+    def __repr__(self):
+        return "<BomLine {}: {} - {}>".format(self.name, self.quantity(), self.status)
+
+
+def placement_status(cmp):
+    if cmp.feeder_ID in ['NoMount', 'NewSkip']:
+        return cmp.feeder_ID
+    return "Mount"
+
+
+def build_bom(placements):
+    # Group the placements by component name, in a single pass
+    # placements: list of (job name, PartPlacement), job name is None for the components not mounted
+    # Returns the BomLine list, in order of first appearance
+    lines = OrderedDict()
+    for (job, cmp) in placements:
+        name = cmp.component_name()
+        line = lines.get(name)
+        if line is None:
+            line = lines[name] = BomLine(name, value=cmp.value, footprint=cmp.footprint)
+
+        line.designators.append(cmp.designator)
+        if job is not None:
+            line.jobs[job] = None
+            line.feeder_IDs[cmp.feeder_ID] = None
+
+        # A component mounted in any job is mounted, whatever the status of its other placements
+        status = placement_status(cmp)
+        if line.status is None or status == "Mount":
+            line.status = status
+
+    return list(lines.values())
+
+
+def bom_rows(bom, board_quantity=1, attrition=0.0):
+    rows = [BOM_HEADER]
+    for line in bom:
+        rows.append([line.name,
+            line.value,
+            line.footprint,
+            line.quantity(),
+            line.status,
+            " ".join(line.jobs),
+            " ".join(str(feeder_ID) for feeder_ID in line.feeder_IDs),
+            " ".join(line.designators),
+            line.reel_quantity(board_quantity, attrition) if line.status != "NoMount" else 0
+            ])
+    return rows
+
+
+def bom_format_error(file_type):
+    # Returns a message if no installed pyexcel plugin can write this file type, None otherwise
+    try:
+        pyexcel.Sheet([BOM_HEADER]).save_to_memory(file_type)
+    except Exception as e:
+        return "Can't write a {} BOM, is the pyexcel plugin installed (pyexcel-xlsx for xlsx, pyexcel-xls for xls)? {}".format(file_type, e)
+    return None
+
+
+def write_bom(path, bom, board_quantity=1, attrition=0.0):
+    # Supported file formats depend on the installed pyexcel plugins : csv, xls, xlsx
+    pyexcel.save_as(array=bom_rows(bom, board_quantity, attrition), dest_file_name=path)
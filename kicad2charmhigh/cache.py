@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import tempfile
+
+from .version import __version__
+
+
+MANIFEST = "manifest.json"
+
+
+def default_cache_dir():
+    return os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'kicad2charmhigh')
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(component_position_file, config_files, options):
+    # Hash of everything the outputs depend on: the package version, the pos file, every
+    # config file (in order) and the options. Each part is tagged and sized so that two
+    # different sets of inputs can't produce the same stream.
+    h = hashlib.sha256()
+
+    def add(tag, data):
+        h.update("{}:{}:".format(tag, len(data)).encode('utf-8'))
+        h.update(data)
+
+    add('version', __version__.encode('utf-8'))
+    with open(component_position_file, 'rb') as fp:
+        add('pos', fp.read())
+    for path in config_files:
+        if path is None:
+            add('config', b'')
+            continue
+        with open(path, 'rb') as fp:
+            add('config', fp.read())
+    add('options', json.dumps(options, sort_keys=True).encode('utf-8'))
+
+    return h.hexdigest()
+
+
+def entry_path(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], key)
+
+
+def cache_entries(cache_dir):
+    # Yield the path of every cache entry
+    if not os.path.isdir(cache_dir):
+        return
+    for prefix in sorted(os.listdir(cache_dir)):
+        prefix_path = os.path.join(cache_dir, prefix)
+        if not os.path.isdir(prefix_path):
+            continue
+        for key in sorted(os.listdir(prefix_path)):
+            if not key.startswith('.'): # Skip the entries being written
+                yield os.path.join(prefix_path, key)
+
+
+class LogRecorder(logging.Handler):
+    """Keep the (level, message) of the records logged during a run, to replay them on a cache hit."""
+    def __init__(self, level=logging.INFO):
+        super().__init__(level)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append((record.levelno, record.getMessage()))
+
+
+def store(cache_dir, key, basename, output_files, log_records=()):
+    # Store the outputs of a run and its log records. The files are named by their suffix after
+    # the basename (the basename itself is part of the key, it is written in the dpv files).
+    path = entry_path(cache_dir, key)
+    if os.path.isdir(path):
+        return path
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary folder and rename it, concurrent runs never see a partial entry
+    tmp_path = tempfile.mkdtemp(prefix='.' + key, dir=os.path.dirname(path))
+    files = {}
+    for output_file in output_files:
+        suffix = os.path.basename(output_file)[len(basename):]
+        shutil.copyfile(output_file, os.path.join(tmp_path, suffix))
+        files[suffix] = file_digest(output_file)
+
+    with open(os.path.join(tmp_path, MANIFEST), 'w', encoding='utf-8') as fp:
+        json.dump({'version': __version__, 'created': time.time(), 'files': files, 'log': list(log_records)}, fp, indent=1, sort_keys=True)
+
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another run stored the same entry in the meantime
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+
+def read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST), encoding='utf-8') as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def restore(cache_dir, key, basepath, basename, link=False):
+    # Copy (or hard link) the stored outputs to basepath
+    # Returns the list of restored files and the stored log records, None on a cache miss
+    path = entry_path(cache_dir, key)
+    if not os.path.isdir(path):
+        return None
+
+    # Never restore part of the outputs: an entry with a missing or modified file is a miss,
+    # and is removed so that this run stores it again
+    problems = check_entry(path)
+    if problems:
+        logging.warning("Invalid cache entry {}: {}".format(path, ", ".join(problems)))
+        shutil.rmtree(path, ignore_errors=True)
+        return None
+    manifest = read_manifest(path)
+
+    restored = []
+    for suffix in sorted(manifest['files']):
+        src = os.path.join(path, suffix)
+        dst = os.path.join(basepath, basename + suffix)
+        if os.path.exists(dst):
+            os.remove(dst)
+        if link:
+            try:
+                os.link(src, dst)
+            except OSError: # Other file system, or not supported
+                shutil.copyfile(src, dst)
+        else:
+            shutil.copyfile(src, dst)
+        restored.append(dst)
+
+    # Keep track of the last use, for pruning
+    os.utime(os.path.join(path, MANIFEST))
+    return restored, manifest.get('log', [])
+
+
+def entry_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def check_entry(path):
+    # Returns a list of problems, empty if the entry is valid
+    manifest = read_manifest(path)
+    if manifest is None:
+        return ["missing or invalid manifest"]
+
+    problems = []
+    for (suffix, digest) in sorted(manifest['files'].items()):
+        file_path = os.path.join(path, suffix)
+        if not os.path.isfile(file_path):
+            problems.append("{} is missing".format(suffix))
+        elif file_digest(file_path) != digest:
+            problems.append("{} is corrupted".format(suffix))
+    return problems
+
+
+def check_cache(cache_dir):
+    # Verify every entry against its manifest
+    # Returns the list of (entry path, problems) of the invalid entries
+    invalid = []
+    for path in cache_entries(cache_dir):
+        problems = check_entry(path)
+        if problems:
+            invalid.append((path, problems))
+    return invalid
+
+
+def prune_cache(cache_dir, max_age_days=None, max_size_mb=None):
+    # Remove the invalid entries, the entries not used for max_age_days, then the least
+    # recently used entries until the cache is smaller than max_size_mb
+    # Returns the list of removed entries
+    removed = []
+    entries = []
+    for path in cache_entries(cache_dir):
+        if check_entry(path):
+            removed.append(path)
+            continue
+        entries.append((os.path.getmtime(os.path.join(path, MANIFEST)), entry_size(path), path))
+
+    entries.sort()
+    if max_age_days is not None:
+        limit = time.time() - max_age_days * 24 * 3600
+        removed += [path for (last_use, _, path) in entries if last_use < limit]
+        entries = [e for e in entries if e[0] >= limit]
+
+    if max_size_mb is not None:
+        total = sum(size for (_, size, _) in entries)
+        while entries and total > max_size_mb * 1024 * 1024:
+            (_, size, path) = entries.pop(0)
+            removed.append(path)
+            total -= size
+
+    for path in removed:
+        shutil.rmtree(path, ignore_errors=True)
+    return removed
+
+
+def cli():
+    parser = argparse.ArgumentParser(description='Manage the kicad2charmhigh conversion cache')
+    parser.add_argument('--cache-dir', type=str, default=default_cache_dir(), help='Cache folder. default: {}'.format(default_cache_dir()))
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('check', help='Verify the stored files of every entry')
+
+    prune_parser = subparsers.add_parser('prune', help='Remove the invalid, old or least recently used entries')
+    prune_parser.add_argument('--max-age', type=float, help='Remove the entries not used for this number of days')
+    prune_parser.add_argument('--max-size', type=float, help='Remove the least recently used entries until the cache is smaller than this size in MB')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.command == 'check':
+        entries = list(cache_entries(args.cache_dir))
+        invalid = check_cache(args.cache_dir)
+        for (path, problems) in invalid:
+            logging.error("{}: {}".format(path, ", ".join(problems)))
+        logging.info("{} entries, {} invalid".format(len(entries), len(invalid)))
+        if invalid:
+            sys.exit(-1)
+
+    elif args.command == 'prune':
+        removed = prune_cache(args.cache_dir, args.max_age, args.max_size)
+        for path in removed:
+            logging.info("Removed {}".format(path))
+        logging.info("{} entries removed".format(len(removed)))
+
+
+if __name__ == '__main__':
+    cli()
@@ -21,23 +21,36 @@ import logging
 import csv
 import urllib.request, urllib.error, urllib.parse
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 import pyexcel
 
 
-from .tools import stof, stoi, clear_utf8_characters, get_feeder, get_working_name, locate_feeder_info
+from .tools import stof, stoi, find_column, optional_stof, clear_utf8_characters, get_feeder, get_working_name, locate_feeder_info
 from .filegeneration import *
 from .Feeder import Feeder
 from .ICTray import ICTray
 from .PartPlacement import PartPlacement
+from .inventory import Inventory, InventoryRun
+from .cycletime import MachineProfile, CycleTimeModel, log_cycle_time_report
+from .validation import validate_placements, board_bounds, log_placement_issues
+from .cache import LogRecorder, cache_key, store, restore, default_cache_dir
+from .bom import build_bom, write_bom, bom_format_error
+from .cuttape_packing import parse_tape_width, packing_parameters_error, count_components, pack_cut_tapes, split_components, build_cuttape_configs, save_cuttape_sheet, log_packing_report
 
 
 
+def find_size_columns(header):
+    # Optional component size columns (mm, in the tape orientation), used by the placement check
+    return (find_column(header, ['Size X', 'Component Size X']), find_column(header, ['Size Y', 'Component Size Y']))
+
 def load_feeder_info_from_file(path):
+    # May run in a worker process (see load_config_files): don't log from here
     available_feeders = []
     # Read from local file
-    logging.info('Fetching feeder data from: {}'.format(path))
-    for row in pyexcel.get_array(file_name=path, start_row=1): # skip header
+    rows = pyexcel.get_array(file_name=path)
+    (size_x_column, size_y_column) = find_size_columns(rows[0] if rows else [])
+    for row in rows[1:]: # skip header
         if(row[0] != "Stop"):
             # Add a new feeder using these values
             available_feeders.append(Feeder(feeder_ID=row[1],
@@ -54,20 +67,26 @@ def load_feeder_info_from_file(path):
                 use_vision=(row[12] == 'Y'),
                 centroid_correction_x=stof(row[13]),
                 centroid_correction_y=stof(row[14]),
-                aliases=row[15]
+                aliases=row[15],
+                footprint_size_x=optional_stof(row, size_x_column),
+                footprint_size_y=optional_stof(row, size_y_column)
                 ))
         else:
             break # We don't want to read in values after STOP
 
-    logging.info("Feeder update complete")
     return available_feeders
 
 def load_cuttape_info_from_file(path):
     available_feeders = []
     ic_trays = []
+    # May run in a worker process (see load_config_files): don't log from here
     # Read from local file
-    logging.info('Fetching CutTape data from: {}'.format(path))
-    for row in pyexcel.get_array(file_name=path, start_row=1): # skip header
+    rows = pyexcel.get_array(file_name=path)
+    (size_x_column, size_y_column) = find_size_columns(rows[0] if rows else [])
+    # Optional columns of the strips cut on several rows: Component Count is then the count per row
+    row_count_column = find_column(rows[0] if rows else [], ['Row Count'])
+    row_spacing_column = find_column(rows[0] if rows else [], ['Row Spacing'])
+    for row in rows[1:]: # skip header
         # logging.info("ID {}, {} columns".format(row[1], len(row)))
         if(row[0] != "Stop"):
         # Append to feeder list
@@ -86,26 +105,92 @@ def load_cuttape_info_from_file(path):
                 use_vision=(row[13] == 'Y'),
                 centroid_correction_x=stof(row[14]),
                 centroid_correction_y=stof(row[15]),
-                aliases=row[16] if len(row) > 16 else ""
+                aliases=row[16] if len(row) > 16 else "",
+                footprint_size_x=optional_stof(row, size_x_column),
+                footprint_size_y=optional_stof(row, size_y_column)
                 ))
 
         # Append to the IC Tray Data
+            row_count = max(int(optional_stof(row, row_count_column, 1)), 1)
             ic_trays.append(ICTray(feeder_ID=row[1],
                 first_IC_center_X=stof(row[3]),
                 first_IC_center_Y=stof(row[4]),
 
                 last_IC_center_X=stof(row[3]) + stoi(row[6]) * (stoi(row[5]) - 1),
-                last_IC_center_Y=stof(row[4]),
+                last_IC_center_Y=stof(row[4]) + optional_stof(row, row_spacing_column) * (row_count - 1),
                 number_X=stoi(row[5]),
-                number_Y=1,
+                number_Y=row_count,
                 start_IC=0
             ))
         else:
             break # We don't want to read in values after STOP
 
-    logging.info("Feeder update complete")
     return [available_feeders, ic_trays]
 
+def load_tape_info_from_file(path, pitch=4.0, tape_width=8.0):
+    # Tape of the components to pack on cut tapes: {component name: (pitch, tape width)}
+    # Uses the Component, Tape Size and Feed Spacing columns, as in the cut tape files
+    tapes = OrderedDict()
+    logging.info('Fetching tape data from: {}'.format(path))
+    rows = pyexcel.get_array(file_name=path)
+    header = rows[0] if rows else []
+    name_column = find_column(header, ['Component', 'Device Name'])
+    if name_column is None:
+        raise ValueError("{}: no Component column".format(path))
+    size_column = find_column(header, ['Tape Size', 'Tape Width'])
+    pitch_column = find_column(header, ['Feed Spacing', 'Pitch'])
+    for row in rows[1:]: # skip header
+        if(row[0] == "Stop"):
+            break # We don't want to read in values after STOP
+        if name_column >= len(row) or str(row[name_column]).strip() == "":
+            continue
+        tapes[clear_utf8_characters(str(row[name_column])).strip()] = (optional_stof(row, pitch_column, pitch),
+            parse_tape_width(row[size_column], tape_width) if size_column is not None and size_column < len(row) else tape_width)
+
+    logging.info("Tape update complete")
+    return tapes
+
+def config_executor(paths):
+    # csv files are only I/O bound, use threads.
+    # The other formats (ods, xlsx...) are zip archives with XML to parse: CPU bound, use processes.
+    # A single file is loaded in a thread as well, a process would only add overhead.
+    if len(paths) <= 1 or all(os.path.splitext(path)[1].lower() in ['.csv', '.tsv'] for path in paths):
+        return ThreadPoolExecutor(max_workers=max(len(paths), 1))
+    return ProcessPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1))
+
+def load_config_files(feeder_config_file, cuttape_config_files):
+    # Load the feeder and cut tape files concurrently
+    # Returns the feeders and the list of [feeders, ic_trays] of each cut tape file, in the order given
+    # Everything is logged from here: the worker processes may not have the log handlers
+    # (spawn and forkserver start methods)
+    loads = []
+    if feeder_config_file is not None:
+        loads.append((load_feeder_info_from_file, feeder_config_file, 'feeder'))
+    for cuttape_config_file in cuttape_config_files or []:
+        loads.append((load_cuttape_info_from_file, cuttape_config_file, 'CutTape'))
+
+    with config_executor([path for (_, path, _) in loads]) as executor:
+        futures = []
+        for (load, path, kind) in loads:
+            logging.info('Fetching {} data from: {}'.format(kind, path))
+            futures.append(executor.submit(load, path))
+
+    # Every file has been loaded (or failed): report all the bad sheets at once
+    results = []
+    failed = False
+    for ((load, path, kind), future) in zip(loads, futures):
+        try:
+            results.append(future.result())
+            logging.info("Feeder update complete ({})".format(path))
+        except Exception as e:
+            logging.error("Could not load {}: {}".format(path, e))
+            failed = True
+    if failed:
+        sys.exit(-1)
+
+    feeders_info = results.pop(0) if feeder_config_file is not None else None
+    return feeders_info, results
+
 def load_component_info(component_position_file):
     # Get position info from file
     componentCount = 0
@@ -140,12 +225,15 @@ def load_component_info(component_position_file):
 
     return components, cmp_not_mounted
 
-def link_components(components, feeders, offset, mirror_x, board_width):
+def link_components(components, feeders, offset, mirror_x, board_width, exclude_feeders=()):
     for cmp in components:
         #componentName = cmp.component_name()
 
+        # Start from the position file values: the components not mounted by a job are linked again by the next one
+        (cmp.x, cmp.y, cmp.rotation) = cmp.original_position
+
         # Find this component in the available feeders if possible
-        cmp.feeder_ID = locate_feeder_info(cmp, feeders)
+        cmp.feeder_ID = locate_feeder_info(cmp, feeders, exclude_feeders)
 
         # Find the associated feeder
         feeder = get_feeder(cmp.feeder_ID, feeders)
@@ -209,6 +297,86 @@ def find_fiducials(components):
     return fiducials
 
 
+def run_job(cuttape_name, feeders, ic_trays, components, component_position_file, basepath, basename, include_unassigned_components, offset, mirror_x, board_width, date=None, machine_profile=None, inventory_run=None, inventory_reassign=False):
+    # Link the components to the feeders of this job and write its dpv file
+    # Estimate its cycle time if a machine profile is given
+    # Check and record the reel quantities if an inventory is given
+    # Returns the dpv file, the components mounted by this job and the remaining ones
+    outfile_dpv = os.path.join(basepath, "{basename}-{cuttape_name}.dpv".format(basename=basename, cuttape_name=cuttape_name))
+
+    logging.info("")
+    logging.info("===============================================")
+    logging.info(".............Job: %s..............", cuttape_name)
+    exclude_feeders = ()
+    if inventory_run is not None:
+        exclude_feeders = inventory_run.check_job(components, feeders, inventory_reassign)
+
+    link_components(components, feeders, offset, mirror_x, board_width, exclude_feeders)
+
+    # Detect fiducials in the components list
+    fiducials = find_fiducials(components)
+
+    # Mark all the available feeders that have a component in this design
+    for cmp in components:
+        for feeder in feeders:
+            if feeder.feeder_ID == cmp.feeder_ID:
+                feeder.count_in_design += 1
+
+    if inventory_run is not None:
+        inventory_run.record_job(feeders)
+
+    logging.info("")
+    logging.info("Components to mount:")
+    for comp in [c for c in components if c.feeder_ID not in ['NoMount', 'NewSkip']]:
+        logging.info(comp)
+
+    logging.info("")
+    logging.info("Used Feeders:")
+    for feeder in feeders:
+        if feeder.count_in_design != 0 and feeder.feeder_ID != "NoMount":
+            logging.info(feeder)
+
+    logging.info("")
+    logging.info("Fiducials:")
+    for fid in fiducials:
+        logging.info("{}: \t{}\t{}".format(fid.designator, fid.x, fid.y))
+
+
+    # Output to machine recipe file
+    with open(outfile_dpv, 'w', encoding='utf-8', newline='\r\n') as f:
+        add_header(f, outfile_dpv, component_position_file, date)
+
+        add_feeders(f, feeders)
+
+        add_batch(f)
+
+        add_components(f, components, feeders, include_unassigned_components)
+
+        add_ic_tray(f, ic_trays)
+
+        add_PCB_calibrate(f, fiducials)
+
+        add_fiducials(f, fiducials)
+
+        add_calibration_factor(f)
+
+    logging.info("")
+    logging.info('Wrote output to {}'.format(outfile_dpv))
+
+    if machine_profile is not None:
+        log_cycle_time_report(CycleTimeModel(components, feeders, ic_trays, machine_profile).simulate())
+
+    mounted = [c for c in components if c.feeder_ID not in ['NoMount', 'NewSkip']]
+    remaining = [c for c in components if c.feeder_ID in ['NoMount', 'NewSkip']]
+    return outfile_dpv, mounted, remaining
+
+
+def reproducible_date():
+    # Fixed date for the reproducible builds: SOURCE_DATE_EPOCH if set (see reproducible-builds.org)
+    epoch = stoi(os.environ.get('SOURCE_DATE_EPOCH', ''), 315532800) # 1980-01-01
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).replace(tzinfo=None)
+
+
 def configure_log(basepath, basename):
     output_log = os.path.join(basepath, "{basename}.log".format(basename=basename))
     logger = logging.getLogger()
@@ -227,7 +395,7 @@ def configure_log(basepath, basename):
     logger.addHandler(ch)
     logger.addHandler(fh)
 
-def main(component_position_file, feeder_config_file, cuttape_config_files, output_folder=None, basename=None, include_unassigned_components=False, offset=[0, 0], mirror_x=False, board_width=0, merge_first_tape=False):
+def main(component_position_file, feeder_config_file, cuttape_config_files, output_folder=None, basename=None, include_unassigned_components=False, offset=[0, 0], mirror_x=False, board_width=0, merge_first_tape=False, pack_cuttape_area=None, pack_cuttape_pitch=4.0, pack_cuttape_tape_width=8.0, pack_cuttape_row_gap=2.0, pack_cuttape_tape_file=None, bom_format=None, board_quantity=1, attrition=0.0, deterministic=False, cache_dir=None, cache_link=False, board_size=None, collision_tolerance=0.1, machine_profile=None, inventory_db=None, inventory_reassign=False):
     logging.getLogger().setLevel(logging.INFO)
     
     # basic file verification
@@ -244,11 +412,100 @@ def main(component_position_file, feeder_config_file, cuttape_config_files, outp
         logging.error("{} is not an existing dir".format(basepath))
         sys.exit(-1)
 
+    pack_cuttape_tapes = None
+    if pack_cuttape_area is not None:
+        if pack_cuttape_tape_file is not None:
+            try:
+                pack_cuttape_tapes = load_tape_info_from_file(pack_cuttape_tape_file, pack_cuttape_pitch, pack_cuttape_tape_width)
+            except Exception as e:
+                logging.error("Could not load {}: {}".format(pack_cuttape_tape_file, e))
+                sys.exit(-1)
+        error = packing_parameters_error(pack_cuttape_area, pack_cuttape_pitch, pack_cuttape_tape_width, pack_cuttape_row_gap, pack_cuttape_tapes)
+        if error is not None:
+            logging.error(error)
+            sys.exit(-1)
+
+    if bom_format is not None:
+        error = bom_format_error(bom_format)
+        if error is not None:
+            logging.error(error)
+            sys.exit(-1)
+
+    # A cache hit would skip the placements, the inventory would not be updated
+    if cache_dir is not None and inventory_db is not None:
+        logging.warning("The cache is not used with an inventory")
+        cache_dir = None
+
+    # The cached outputs must not depend on the time they were generated
+    if cache_dir is not None:
+        deterministic = True
+
+    date = None
+    if deterministic:
+        date = reproducible_date()
+
     if basename is None:
-        basename = "{date}-{basename}".format(date=datetime.datetime.now().strftime("%Y%m%d-%H%M%S"), basename=os.path.splitext(os.path.basename(component_position_file))[0])
+        if deterministic:
+            basename = os.path.splitext(os.path.basename(component_position_file))[0]
+        else:
+            basename = "{date}-{basename}".format(date=datetime.datetime.now().strftime("%Y%m%d-%H%M%S"), basename=os.path.splitext(os.path.basename(component_position_file))[0])
 
     configure_log(basepath, basename)
 
+    if cache_dir is not None:
+        # Everything the outputs depend on. The basename and the pos file name are written in the dpv files.
+        options = {
+            'pos_file': os.path.basename(component_position_file),
+            'basename': basename,
+            'cuttape_names': [os.path.splitext(os.path.basename(path))[0] for path in cuttape_config_files or []],
+            'include_unassigned_components': include_unassigned_components,
+            'offset': list(offset),
+            'mirror_x': mirror_x,
+            'board_width': board_width,
+            'merge_first_tape': merge_first_tape,
+            'pack_cuttape_area': pack_cuttape_area,
+            'pack_cuttape_pitch': pack_cuttape_pitch,
+            'pack_cuttape_tape_width': pack_cuttape_tape_width,
+            'pack_cuttape_row_gap': pack_cuttape_row_gap,
+            'bom_format': bom_format,
+            'board_quantity': board_quantity,
+            'attrition': attrition,
+            'date': date.isoformat(),
+            'board_size': board_size,
+            'collision_tolerance': collision_tolerance,
+        }
+        config_files = [feeder_config_file] + list(cuttape_config_files or []) + [pack_cuttape_tape_file]
+        try:
+            key = cache_key(component_position_file, config_files, options)
+        except OSError:
+            # Report every file that can't be read, as load_config_files does
+            for path in [component_position_file] + [path for path in config_files if path is not None]:
+                try:
+                    open(path, 'rb').close()
+                except OSError as e:
+                    logging.error("Could not load {}: {}".format(path, e))
+            sys.exit(-1)
+
+        restored = restore(cache_dir, key, basepath, basename, cache_link)
+        if restored is not None:
+            (restored_files, log_records) = restored
+            logging.info("Cache hit: {}".format(key))
+            # Replay the log of the run, with the placement check warnings
+            for (level, message) in log_records:
+                logging.log(level, message)
+            logging.info("")
+            for path in restored_files:
+                logging.info('Restored {}'.format(path))
+            return
+        logging.info("Cache miss: {}".format(key))
+
+        # Record the log of the run, stored with the outputs
+        log_recorder = LogRecorder()
+        logging.getLogger().addHandler(log_recorder)
+
+    output_files = []
+    job_feeders = OrderedDict()
+    inventory_run = InventoryRun(Inventory(inventory_db), board_quantity) if inventory_db is not None else None
 
     # Get position info from file
     components, cmp_not_mounted = load_component_info(component_position_file)
@@ -263,12 +520,11 @@ def main(component_position_file, feeder_config_file, cuttape_config_files, outp
     logging.info("")
     
 
-    # Load all known feeders from file
-    if feeder_config_file is not None:
-        feeders_info = load_feeder_info_from_file(feeder_config_file)
+    # Load all known feeders and cut tapes from file
+    feeders_info, cuttape_infos = load_config_files(feeder_config_file, cuttape_config_files)
 
     if cuttape_config_files is not None:
-        feeders_configs = [[os.path.splitext(os.path.basename(cuttape_config_file))[0], load_cuttape_info_from_file(cuttape_config_file)] for cuttape_config_file in cuttape_config_files]
+        feeders_configs = [[os.path.splitext(os.path.basename(cuttape_config_file))[0], cuttape_info] for (cuttape_config_file, cuttape_info) in zip(cuttape_config_files, cuttape_infos)]
         if merge_first_tape:
             feeders_configs[0][0] = "feeders_and_" + feeders_configs[0][0]
             feeders_configs[0][1][0] = feeders_info + feeders_configs[0][1][0]
@@ -280,69 +536,63 @@ def main(component_position_file, feeder_config_file, cuttape_config_files, outp
         feeders_configs = [["Feeders", [feeders_info, []]]]
 
     for (cuttape_name, (feeders, ic_trays)) in feeders_configs:
-        outfile_dpv = os.path.join(basepath, "{basename}-{cuttape_name}.dpv".format(basename=basename, cuttape_name=cuttape_name))
-
-        logging.info("")
-        logging.info("===============================================")
-        logging.info(".............Job: %s..............", cuttape_name)
-        link_components(components, feeders, offset, mirror_x, board_width)
+        outfile_dpv, mounted, components = run_job(cuttape_name, feeders, ic_trays, components, component_position_file, basepath, basename, include_unassigned_components, offset, mirror_x, board_width, date, machine_profile, inventory_run, inventory_reassign)
+        output_files.append(outfile_dpv)
+        job_feeders[cuttape_name] = feeders
+        components_bom += [(cuttape_name, c) for c in mounted]
 
-        # Detect fiducials in the components list
+    # Lay out the remaining unassigned components on cut tapes, and add as many jobs as needed
+    if pack_cuttape_area is not None:
         fiducials = find_fiducials(components)
-
-        # Mark all the available feeders that have a component in this design
-        for cmp in components:
-            for feeder in feeders:
-                if feeder.feeder_ID == cmp.feeder_ID:
-                    feeder.count_in_design += 1
-
-        logging.info("")
-        logging.info("Components to mount:")
-        for comp in [c for c in components if c.feeder_ID not in ['NoMount', 'NewSkip']]:
-            logging.info(comp)
-
-        logging.info("")
-        logging.info("Used Feeders:")
-        for feeder in feeders:
-            if feeder.count_in_design != 0 and feeder.feeder_ID != "NoMount":
-                logging.info(feeder)
-
-        logging.info("")
-        logging.info("Fiducials:")
-        for fid in fiducials:
-            logging.info("{}: \t{}\t{}".format(fid.designator, fid.x, fid.y))
-
-
-        # Output to machine recipe file
-        with open(outfile_dpv, 'w', encoding='utf-8', newline='\r\n') as f:
-            add_header(f, outfile_dpv, component_position_file)
-
-            add_feeders(f, feeders)
-
-            add_batch(f)
-
-            add_components(f, components, feeders, include_unassigned_components)
-
-            add_ic_tray(f, ic_trays)
-
-            add_PCB_calibrate(f, fiducials)
-
-            add_fiducials(f, fiducials)
-
-            add_calibration_factor(f)
-
-        logging.info("")
-        logging.info('Wrote output to {}'.format(outfile_dpv))
-
-        components_bom += [c for c in components if c.feeder_ID not in ['NoMount', 'NewSkip']]
-        components = [c for c in components if c.feeder_ID in ['NoMount', 'NewSkip']]
+        quantities = count_components([c for c in components if c.feeder_ID == 'NewSkip' and c not in fiducials])
+        passes = pack_cut_tapes(quantities, pack_cuttape_area, pitch=pack_cuttape_pitch, tape_width=pack_cuttape_tape_width, row_gap=pack_cuttape_row_gap, tapes=pack_cuttape_tapes) if quantities else []
+        sheets = build_cuttape_configs(passes)
+        log_packing_report(passes)
+
+        for (idx, (cuttape_pass, sheet)) in enumerate(zip(passes, sheets)):
+            cuttape_name = "packed{}".format(idx + 1)
+            outfile_sheet = os.path.join(basepath, "{basename}-{cuttape_name}.csv".format(basename=basename, cuttape_name=cuttape_name))
+            save_cuttape_sheet(outfile_sheet, sheet)
+            logging.info('Wrote cut tape sheet to {}'.format(outfile_sheet))
+
+            # Only give this job the components its strips can hold (and the fiducials)
+            selected, components = split_components(components, cuttape_pass)
+            outfile_dpv, mounted, remaining = run_job(cuttape_name, cuttape_pass.feeders, cuttape_pass.ic_trays, selected + fiducials, component_position_file, basepath, basename, include_unassigned_components, offset, mirror_x, board_width, date, machine_profile, inventory_run, inventory_reassign)
+            output_files += [outfile_sheet, outfile_dpv]
+            job_feeders[cuttape_name] = cuttape_pass.feeders
+            components_bom += [(cuttape_name, c) for c in mounted]
+            components += [c for c in remaining if c not in fiducials]
+
+    # Look for placements landing on the same spot or outside of the board, on all the jobs
+    feeders_by_ID = dict((job, dict((feeder.feeder_ID, feeder) for feeder in feeders)) for (job, feeders) in job_feeders.items())
+    placements = [(c, feeders_by_ID[job].get(c.feeder_ID)) for (job, c) in components_bom]
+    bounds = board_bounds(board_size, offset, mirror_x, board_width) if board_size is not None else None
+    log_placement_issues(validate_placements(placements, collision_tolerance, bounds))
 
     logging.info("")
     logging.info("Components Not Mounted:")
     for comp in components:
         logging.info(comp)
 
-    components_bom += components
+    components_bom += [(None, c) for c in components]
+
+    if bom_format is not None:
+        outfile_bom = os.path.join(basepath, "{basename}-bom.{ext}".format(basename=basename, ext=bom_format))
+        # Fiducials are not components to kit
+        fiducials = find_fiducials([c for (_, c) in components_bom])
+        write_bom(outfile_bom, build_bom([(job, c) for (job, c) in components_bom if c not in fiducials]), board_quantity, attrition / 100.0)
+        logging.info("")
+        logging.info('Wrote BOM to {}'.format(outfile_bom))
+        output_files.append(outfile_bom)
+
+    if cache_dir is not None:
+        logging.getLogger().removeHandler(log_recorder)
+        store(cache_dir, key, basename, output_files, log_recorder.records)
+
+    # All the jobs are written: update the inventory in one transaction
+    if inventory_run is not None:
+        inventory_run.commit()
+        inventory_run.inventory.close()
 
 
 def set_args_parser(parser):
@@ -359,6 +609,39 @@ def set_args_parser(parser):
 
     parser.add_argument('--offset', nargs=2, type=float, default=[0, 0], metavar=('x', 'y'), help='Global offset added to every component.')
 
+    packing_group = parser.add_argument_group("Packing unassigned components on cut tapes")
+    packing_group.add_argument('--pack-cuttape-area', nargs=4, type=float, metavar=('x', 'y', 'width', 'height'), help='Usable tray area in mm. When set, the components not found in any feeder or cut tape file are laid out on cut tape strips in this area, and the matching cut tape sheets and jobs are generated.')
+    packing_group.add_argument('--pack-cuttape-tape-file', type=str, help='Tape of the components to pack: Component, Tape Size and Feed Spacing columns, as in the cut tape files. The components not listed use --pack-cuttape-pitch and --pack-cuttape-tape-width.')
+    packing_group.add_argument('--pack-cuttape-pitch', type=float, default=4.0, help='Component pitch on the tape in mm. default: 4')
+    packing_group.add_argument('--pack-cuttape-tape-width', type=float, default=8.0, help='Tape width in mm. default: 8')
+    packing_group.add_argument('--pack-cuttape-row-gap', type=float, default=2.0, help='Gap between two rows of strips in mm, a row is as high as its tape width plus this gap. default: 2')
+
+    bom_group = parser.add_argument_group("BOM and kitting list")
+    bom_group.add_argument('--bom', dest='bom_format', nargs='?', const='csv', choices=['csv', 'xls', 'xlsx'], help='Write the BOM of the jobs ($basename-bom.csv by default): components grouped by name with their jobs, feeders, designators and the reel quantity to kit.')
+    bom_group.add_argument('--board-quantity', type=int, default=1, help='Number of boards to produce, for the BOM and the inventory. default: 1')
+    bom_group.add_argument('--attrition', type=float, default=0.0, help='Extra components to kit, in percent of the quantity. default: 0')
+
+    check_group = parser.add_argument_group("Placement check")
+    check_group.add_argument('--board-size', nargs=2, type=float, metavar=('width', 'height'), help='PCB size in mm, to report the components placed outside of the board. The board starts at --offset.')
+    check_group.add_argument('--collision-tolerance', type=float, default=0.1, help='Size in mm of the components without a size in the feeder file, when looking for overlapping placements. default: 0.1')
+
+    inventory_group = parser.add_argument_group("Reel inventory")
+    inventory_group.add_argument('--inventory-db', type=str, help='SQLite file with the remaining quantity of the reels (see kicad2charmhigh-inventory). The placements of the run, times --board-quantity, are subtracted from it, and the reels that would run out are reported.')
+    inventory_group.add_argument('--inventory-reassign', action="store_true", help='Move the components of a short reel to another feeder carrying the same part (name or alias) with enough components left.')
+
+    cycle_group = parser.add_argument_group("Cycle time estimation")
+    cycle_group.add_argument('--estimate-cycle-time', action="store_true", help='Simulate each job and report its estimated duration, the time per stage and the busiest feeders.')
+    cycle_group.add_argument('--machine-velocity', type=float, default=MachineProfile().velocity, help='Gantry velocity in mm/s. default: %(default)s')
+    cycle_group.add_argument('--machine-acceleration', type=float, default=MachineProfile().acceleration, help='Gantry acceleration in mm/s^2. default: %(default)s')
+    cycle_group.add_argument('--feeder-origin', nargs=2, type=float, default=list(MachineProfile().feeder_origin), metavar=('x', 'y'), help='Pick position of feeder 1 in mm, the station DeltX/DeltY are added to it. default: %(default)s')
+    cycle_group.add_argument('--feeder-pitch', type=float, default=MachineProfile().feeder_pitch, help='Distance between two feeders on the rail, along X, in mm. default: %(default)s')
+
+    cache_group = parser.add_argument_group("Reproducible outputs and cache")
+    cache_group.add_argument('--deterministic', action="store_true", help='Reproducible outputs: fixed date in the dpv files ($SOURCE_DATE_EPOCH or 1980-01-01), and basename defaults to the pos file name.')
+    cache_group.add_argument('--cache', action="store_true", help='Reuse the outputs of a previous run with the same pos file, config files, options and version. Implies --deterministic.')
+    cache_group.add_argument('--cache-dir', type=str, help='Cache folder, implies --cache. default: {}'.format(default_cache_dir()))
+    cache_group.add_argument('--cache-link', action="store_true", help='Hard link the cached outputs instead of copying them.')
+
     mirror_group = parser.add_argument_group("Processing bottom component files")
     mirror_group.add_argument('--mirror-x', action="store_true", help='Mirror components along X axis. Useful when processing a file with components mounted on the bottom.')
 
@@ -370,7 +653,15 @@ def cli():
     set_args_parser(parser)
     args = parser.parse_args()
 
-    main(args.component_position_file, args.feeder_config_file, args.cuttape_config_files, args.output_folder, args.basename, args.include_unassigned_components, args.offset, args.mirror_x, args.board_width)
+    main(args.component_position_file, args.feeder_config_file, args.cuttape_config_files, args.output_folder, args.basename, args.include_unassigned_components, args.offset, args.mirror_x, args.board_width,
+        pack_cuttape_area=args.pack_cuttape_area, pack_cuttape_pitch=args.pack_cuttape_pitch, pack_cuttape_tape_width=args.pack_cuttape_tape_width,
+        pack_cuttape_row_gap=args.pack_cuttape_row_gap, pack_cuttape_tape_file=args.pack_cuttape_tape_file,
+        bom_format=args.bom_format, board_quantity=args.board_quantity, attrition=args.attrition,
+        deterministic=args.deterministic, cache_dir=args.cache_dir or (default_cache_dir() if args.cache else None), cache_link=args.cache_link,
+        board_size=args.board_size, collision_tolerance=args.collision_tolerance,
+        machine_profile=MachineProfile(velocity=args.machine_velocity, acceleration=args.machine_acceleration,
+            feeder_origin=tuple(args.feeder_origin), feeder_pitch=args.feeder_pitch) if args.estimate_cycle_time else None,
+        inventory_db=args.inventory_db, inventory_reassign=args.inventory_reassign)
 
 
 if __name__ == '__main__':
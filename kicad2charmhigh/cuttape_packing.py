@@ -0,0 +1,293 @@
+import re
+import math
+import logging
+from collections import OrderedDict
+
+import pyexcel
+
+from .tools import stof
+from .Feeder import Feeder
+from .ICTray import ICTray
+
+
+# Feeder IDs of the generated IC trays, 99 is used for the NewSkip components (see add_components)
+FIRST_CUTTAPE_ID = 80
+LAST_CUTTAPE_ID = 98
+
+# Same columns as the cut tape sheets read by load_cuttape_info_from_file
+CUTTAPE_SHEET_HEADER = ['Tape Size', 'Feeder Index', 'Component', 'First Component X', 'First Component Y',
+    'Component Count', 'Feed Spacing', 'Height', 'Speed', 'Head', 'Relative Tape Angle', 'Place Component',
+    'Check Vacuum', 'Use Vision', 'Centroid Correction X', 'Centroid Correction Y', 'Aliases', 'Row Count', 'Row Spacing']
+
+
+class CutTapeStrip():
+    """A cut tape strip laid out on a row of the tray area, or a strip cut on several
+    consecutive rows (rows > 1): columns components per row, the last row may be shorter.
+    """
+    def __init__(self,
+        device_name,
+        count,
+        pitch,
+        tape_width = 8.0,
+        row = 0,
+        row_spacing = 10.0,
+        x = 0.0,
+        y = 0.0,
+        rows = 1,
+        columns = None
+        ):
+
+        self.device_name = device_name
+        self.count = count
+        self.pitch = pitch
+        self.tape_width = tape_width
+        self.row = row
+        # Height of the row(s) the strip is in
+        self.row_spacing = row_spacing
+        self.x = x
+        self.y = y
+        self.rows = rows
+        self.columns = columns if columns is not None else count
+
+    def length(self):
+        # Length taken on the first row
+        return self.columns * self.pitch
+
+    def __repr__(self):
+        return "<CutTapeStrip {}: {} x {}mm, {}mm tape, row {}{}>".format(self.device_name, self.count, self.pitch, self.tape_width, self.row,
+            " ({} rows)".format(self.rows) if self.rows > 1 else "")
+
+
+class CutTapePass():
+    """One cut tape job: the strips of a single tray load and the resulting feeders and IC trays."""
+    def __init__(self,
+        strips,
+        tray_area
+        ):
+
+        self.strips = strips
+        self.tray_area = tray_area
+        self.feeders = []
+        self.ic_trays = []
+
+    def utilization(self):
+        # Fraction of the tray area covered by the strips
+        (_, _, width, height) = self.tray_area
+        if width <= 0 or height <= 0:
+            return 0.0
+        used = sum(strip.count * strip.pitch * strip.row_spacing for strip in self.strips)
+        return used / (width * height)
+
+    def component_count(self):
+        return sum(strip.count for strip in self.strips)
+
+
+def count_components(components):
+    # Group the components by name, keeping the order of first appearance
+    quantities = OrderedDict()
+    for cmp in components:
+        name = cmp.component_name()
+        quantities[name] = quantities.get(name, 0) + 1
+    return quantities
+
+
+def parse_tape_width(tape_size, default=8.0):
+    # Width in mm of a tape size as written in the cut tape files: "8mm", "12 mm", 8...
+    match = re.match(r'\s*([0-9.]+)', str(tape_size))
+    return stof(match.group(1), default) if match else default
+
+
+def packing_parameters_error(tray_area, pitch, tape_width, row_gap=2.0, tapes=None):
+    # Returns a message if the tray area can't hold a single component of every tape, None otherwise
+    # tapes: {component name: (pitch, tape width)} of the components that don't use the defaults
+    (_, _, width, height) = tray_area
+    if row_gap < 0:
+        return "Gap between the rows ({}mm) must not be negative".format(row_gap)
+    for (name, (part_pitch, part_width)) in [(None, (pitch, tape_width))] + list((tapes or {}).items()):
+        part = " ({})".format(name) if name is not None else ""
+        if part_pitch <= 0 or part_width <= 0:
+            return "Cut tape pitch ({}mm) and width ({}mm){} must be positive".format(part_pitch, part_width, part)
+        if height < part_width + row_gap:
+            return "Tray area height ({}mm) is too small for a {}mm tape{}".format(height, part_width, part)
+        if width < part_pitch:
+            return "Tray area width ({}mm) is too small for a {}mm pitch{}".format(width, part_pitch, part)
+    return None
+
+
+def pack_cut_tapes(quantities, tray_area, pitch=4.0, tape_width=8.0, row_gap=2.0, tapes=None, max_strips=LAST_CUTTAPE_ID - FIRST_CUTTAPE_ID + 1):
+    # Lay out one cut tape strip per component name on rows of the tray area.
+    # A row is as high as its tape width plus row_gap, it is opened for the widest tape placed
+    # in it and can take narrower tapes as well.
+    # Each pass is filled with a First Fit Decreasing heuristic: the widest then longest strips
+    # are placed first, each one in the first row where it still fits, or in a new row if the
+    # area height allows it. A strip that does not fit anywhere is cut to fill the emptiest row.
+    # A component has a single feeder ID in a job, so it can only get one strip per pass: if it
+    # needs more than a full row, it is laid out on as many consecutive new rows as the area
+    # height allows, as a single IC tray of several rows, and the remainder goes to the next pass.
+    # Each strip needs a feeder ID: a pass holds at most max_strips strips, the next ones go to
+    # the next pass.
+    # quantities: {component name: count}, tray_area: (x, y, width, height) in mm
+    # tapes: {component name: (pitch, tape width)}, the other components use pitch and tape_width
+    # Returns the list of CutTapePass, in order.
+    (area_x, area_y, width, height) = tray_area
+    tapes = tapes or {}
+
+    def tape(name):
+        return tapes.get(name, (pitch, tape_width))
+
+    error = packing_parameters_error(tray_area, pitch, tape_width, row_gap, dict((name, tape(name)) for name in quantities))
+    if error is not None:
+        raise ValueError(error)
+    if max_strips < 1:
+        raise ValueError("A pass must hold at least one strip")
+
+    remaining = OrderedDict((name, qty) for (name, qty) in quantities.items() if qty > 0)
+
+    passes = []
+    while remaining:
+        # Open rows: [y, height, tape width, free length]
+        rows = []
+        height_free = height
+        strips = []
+
+        # Widest tape first, then longest strip, ties keep the original order (sorted is stable)
+        order = sorted(remaining.keys(), key=lambda name: (-tape(name)[1], -remaining[name] * tape(name)[0]))
+        for name in order:
+            if len(strips) == max_strips:
+                break
+            (part_pitch, part_width) = tape(name)
+            row_height = part_width + row_gap
+            columns = int(width // part_pitch)
+            count = min(remaining[name], columns)
+
+            if remaining[name] > columns and height_free >= row_height:
+                # Longer than a row: fill consecutive new rows, the last one can take other strips
+                strip_rows = min(int(math.ceil(remaining[name] / float(columns))), int(height_free // row_height))
+                count = min(remaining[name], strip_rows * columns)
+                row = len(rows)
+                for idx in range(strip_rows):
+                    rows.append([area_y + height - height_free, row_height, part_width, 0.0])
+                    height_free -= row_height
+                rows[-1][3] = width - (count - (strip_rows - 1) * columns) * part_pitch
+
+                strips.append(CutTapeStrip(name, count, part_pitch, tape_width=part_width, row=row, row_spacing=row_height,
+                    x=area_x + part_pitch / 2,
+                    y=rows[row][0] + row_height / 2,
+                    rows=strip_rows,
+                    columns=columns))
+
+                remaining[name] -= count
+                if remaining[name] == 0:
+                    del remaining[name]
+                continue
+
+            fitting = [row for row in range(len(rows)) if rows[row][2] >= part_width]
+            for row in fitting:
+                if rows[row][3] >= count * part_pitch:
+                    break
+            else:
+                if height_free >= row_height:
+                    rows.append([area_y + height - height_free, row_height, part_width, width])
+                    height_free -= row_height
+                    row = len(rows) - 1
+                elif fitting:
+                    # The whole strip does not fit anymore: cut it to fill the emptiest row,
+                    # the remainder goes to the next pass
+                    row = max(fitting, key=lambda r: rows[r][3])
+                    count = int(rows[row][3] // part_pitch)
+                    if count == 0:
+                        continue
+                else:
+                    continue
+
+            (row_y, row_height, _, free) = rows[row]
+            strip = CutTapeStrip(name, count, part_pitch, tape_width=part_width, row=row, row_spacing=row_height,
+                x=area_x + (width - free) + part_pitch / 2,
+                y=row_y + row_height / 2)
+            rows[row][3] -= strip.length()
+            strips.append(strip)
+
+            remaining[name] -= count
+            if remaining[name] == 0:
+                del remaining[name]
+
+        # Keep the strips sorted on the tray, row by row
+        strips.sort(key=lambda strip: (strip.row, strip.x))
+        passes.append(CutTapePass(strips, tray_area))
+
+    return passes
+
+
+def split_components(components, cuttape_pass):
+    # A strip only holds a given number of components: pick as many components as the pass
+    # can mount, the others are kept for the next passes
+    available = OrderedDict((strip.device_name, strip.count) for strip in cuttape_pass.strips)
+    selected = []
+    rest = []
+    for cmp in components:
+        name = cmp.component_name()
+        if cmp.feeder_ID == 'NewSkip' and available.get(name, 0) > 0:
+            available[name] -= 1
+            selected.append(cmp)
+        else:
+            rest.append(cmp)
+    return selected, rest
+
+
+def build_cuttape_configs(passes, first_feeder_ID=FIRST_CUTTAPE_ID, height=0.5):
+    # Generate the Feeder / ICTray records of every pass, as load_cuttape_info_from_file would.
+    # Returns one sheet (list of rows) per pass, matching the cut tape file format.
+    sheets = []
+    for cuttape_pass in passes:
+        rows = [CUTTAPE_SHEET_HEADER]
+        cuttape_pass.feeders = []
+        cuttape_pass.ic_trays = []
+
+        for (idx, strip) in enumerate(cuttape_pass.strips):
+            feeder_ID = first_feeder_ID + idx
+
+            cuttape_pass.feeders.append(Feeder(feeder_ID=feeder_ID,
+                device_name=strip.device_name,
+                stack_x_offset=0,
+                stack_y_offset=0,
+                height=height,
+                feed_spacing=0,
+                aliases=""
+                ))
+
+            cuttape_pass.ic_trays.append(ICTray(feeder_ID=feeder_ID,
+                first_IC_center_X=strip.x,
+                first_IC_center_Y=strip.y,
+
+                last_IC_center_X=strip.x + strip.pitch * (strip.columns - 1),
+                last_IC_center_Y=strip.y + strip.row_spacing * (strip.rows - 1),
+                number_X=strip.columns,
+                number_Y=strip.rows,
+                start_IC=0
+            ))
+
+            rows.append(['{:g}mm'.format(strip.tape_width), feeder_ID, strip.device_name, strip.x, strip.y,
+                strip.columns, strip.pitch, height, 0, 1, 0, 'Y', 'Y', 'Y', 0, 0, '', strip.rows, strip.row_spacing])
+
+        rows.append(['Stop'])
+        sheets.append(rows)
+
+    return sheets
+
+
+def save_cuttape_sheet(path, rows):
+    # Supported file formats depend on the installed pyexcel plugins : csv, ods, xls, xlsx...
+    pyexcel.save_as(array=rows, dest_file_name=path)
+
+
+def log_packing_report(passes):
+    logging.info("")
+    logging.info("Cut tape packing: {} pass(es)".format(len(passes)))
+    for (idx, cuttape_pass) in enumerate(passes):
+        logging.info("Pass {}: {} strips, {} components, tray usage {:.1f}%".format(
+            idx + 1,
+            len(cuttape_pass.strips),
+            cuttape_pass.component_count(),
+            100 * cuttape_pass.utilization()))
+        for strip in cuttape_pass.strips:
+            logging.info("\t{}".format(strip))
@@ -0,0 +1,225 @@
+import math
+import logging
+from collections import OrderedDict
+
+
+STAGES = ['travel to feeder', 'pick', 'travel to camera', 'vision', 'travel to board', 'place']
+
+
+class MachineProfile():
+    """Motion and timing parameters of the machine, used to estimate the cycle time.
+    Distances are in mm, velocities in mm/s, accelerations in mm/s^2, times in s.
+    """
+    def __init__(self,
+        velocity = 400.0,
+        acceleration = 3000.0,
+        pick_time = 0.3,
+        place_time = 0.3,
+        feed_time = 0.1,
+        vacuum_time = 0.05,
+        vision_time = 0.3,
+        camera_position = (200.0, 40.0),
+        pcb_origin = (60.0, 100.0),
+        home_position = (0.0, 0.0),
+        feeder_origin = (20.0, 10.0),
+        feeder_pitch = 10.0,
+        feeder_positions = None,
+        heads = 2
+        ):
+
+        self.velocity = velocity
+        self.acceleration = acceleration
+        self.pick_time = pick_time
+        self.place_time = place_time
+        self.feed_time = feed_time
+        self.vacuum_time = vacuum_time
+        self.vision_time = vision_time
+        self.camera_position = camera_position
+        self.pcb_origin = pcb_origin
+        self.home_position = home_position
+        # Reel feeders are on a rail: feeder N is picked at feeder_origin + (N - 1) * feeder_pitch along X.
+        # feeder_positions {feeder ID: (x, y)} overrides the rail position of some feeders.
+        self.feeder_origin = feeder_origin
+        self.feeder_pitch = feeder_pitch
+        self.feeder_positions = feeder_positions if feeder_positions is not None else {}
+        self.heads = heads
+
+
+    def station_position(self, feeder):
+        # Pick position of a reel feeder: its position on the rail, corrected by the
+        # station DeltX/DeltY (stack offsets)
+        if feeder.feeder_ID in self.feeder_positions:
+            (x, y) = self.feeder_positions[feeder.feeder_ID]
+        else:
+            try:
+                index = int(feeder.feeder_ID) - 1
+            except (TypeError, ValueError):
+                index = 0
+            (x, y) = (self.feeder_origin[0] + index * self.feeder_pitch, self.feeder_origin[1])
+        return (x + (feeder.stack_x_offset or 0.0), y + (feeder.stack_y_offset or 0.0))
+
+
+class CycleTimeReport():
+    """Result of a simulation: total time, time per stage and per feeder."""
+    def __init__(self,
+        total = 0.0,
+        stages = None,
+        feeders = None,
+        placements = 0
+        ):
+
+        self.total = total
+        self.stages = stages if stages is not None else OrderedDict((stage, 0.0) for stage in STAGES)
+        self.feeders = feeders if feeders is not None else OrderedDict()
+        self.placements = placements
+
+    def busiest_feeders(self, count=5):
+        # [(feeder ID, time)], the feeders the machine spends the most time on
+        return sorted(self.feeders.items(), key=lambda item: -item[1])[:count]
+
+
+def move_time(dx, dy, velocity, acceleration):
+    # Both axes move at the same time, with a trapezoidal velocity profile
+    # (triangular when the distance is too short to reach the velocity)
+    d = max(abs(dx), abs(dy))
+    if d * acceleration >= velocity * velocity:
+        return d / velocity + velocity / acceleration
+    return 2 * math.sqrt(d / acceleration)
+
+
+class CycleTimeModel():
+    """Machine model of a job, as written by filegeneration: the stations, the EComponent
+    order, the heads, the speed and mount flags of the feeders and the IC tray pick positions.
+
+    Everything that does not depend on the order of the components is computed once, so
+    estimate() can score many orderings.
+    """
+    def __init__(self, components, feeders, ic_trays, profile=None):
+        self.profile = profile if profile is not None else MachineProfile()
+        (origin_x, origin_y) = self.profile.pcb_origin
+
+        feeders_by_ID = dict((feeder.feeder_ID, feeder) for feeder in feeders)
+
+        # Pick positions of the IC trays: one per component on the tray, row by row, starting at start_IC
+        self.tray_positions = {}
+        for tray in ic_trays:
+            count_x = max(tray.number_X, 1)
+            count_y = max(tray.number_Y, 1)
+            step_x = (tray.last_IC_center_X - tray.first_IC_center_X) / (count_x - 1) if count_x > 1 else 0.0
+            step_y = (tray.last_IC_center_Y - tray.first_IC_center_Y) / (count_y - 1) if count_y > 1 else 0.0
+            self.tray_positions[tray.feeder_ID] = [(tray.first_IC_center_X + step_x * (i % count_x), tray.first_IC_center_Y + step_y * (i // count_x))
+                for i in range(tray.start_IC, count_x * count_y)]
+
+        # One tuple per placed component, in the EComponent order:
+        # (feeder ID, place x, place y, head, velocity, pick time, vision, station x, station y)
+        self.placements = []
+        self.components = []
+        for cmp in components:
+            if cmp.feeder_ID in ['NoMount', 'NewSkip'] or not cmp.place_component:
+                continue
+            feeder = feeders_by_ID.get(cmp.feeder_ID)
+            if feeder is None:
+                continue
+
+            # Speed is a percentage of the machine velocity, 0 is full speed
+            speed = cmp.speed if 0 < cmp.speed <= 100 else 100
+
+            (station_x, station_y) = self.profile.station_position(feeder)
+            self.placements.append((cmp.feeder_ID,
+                origin_x + cmp.x,
+                origin_y + cmp.y,
+                cmp.head,
+                self.profile.velocity * speed / 100.0,
+                self.profile.pick_time + self.profile.feed_time + (self.profile.vacuum_time if cmp.check_vacuum else 0.0),
+                cmp.use_vision,
+                station_x,
+                station_y))
+            self.components.append(cmp)
+
+    def _groups(self, order):
+        # Components are picked by batches, one per head: consecutive components on different heads
+        # are picked together, then checked by the camera, then placed
+        group = []
+        for idx in order:
+            placement = self.placements[idx]
+            if len(group) == self.profile.heads or any(p[3] == placement[3] for p in group):
+                yield group
+                group = []
+            group.append(placement)
+        if group:
+            yield group
+
+    def _run(self, order, report):
+        p = self.profile
+        acceleration = p.acceleration
+        (camera_x, camera_y) = p.camera_position
+        (x, y) = p.home_position
+        tray_index = {}
+        total = 0.0
+
+        for group in self._groups(order):
+            # Carrying components: move at the speed of the slowest one
+            velocity = p.velocity
+            vision = False
+
+            for (feeder_ID, _, _, _, cmp_velocity, pick_time, use_vision, station_x, station_y) in group:
+                positions = self.tray_positions.get(feeder_ID)
+                if positions:
+                    idx = tray_index.get(feeder_ID, 0)
+                    tray_index[feeder_ID] = idx + 1
+                    (pick_x, pick_y) = positions[idx % len(positions)]
+                else:
+                    (pick_x, pick_y) = (station_x, station_y)
+
+                t = move_time(pick_x - x, pick_y - y, velocity, acceleration)
+                total += t + pick_time
+                if report is not None:
+                    report.stages['travel to feeder'] += t
+                    report.stages['pick'] += pick_time
+                    report.feeders[feeder_ID] = report.feeders.get(feeder_ID, 0.0) + t + pick_time
+                (x, y) = (pick_x, pick_y)
+                velocity = min(velocity, cmp_velocity)
+                vision = vision or use_vision
+
+            if vision:
+                t = move_time(camera_x - x, camera_y - y, velocity, acceleration)
+                vision_time = p.vision_time * sum(1 for placement in group if placement[6])
+                total += t + vision_time
+                if report is not None:
+                    report.stages['travel to camera'] += t
+                    report.stages['vision'] += vision_time
+                (x, y) = (camera_x, camera_y)
+
+            for (feeder_ID, place_x, place_y, _, cmp_velocity, _, _, _, _) in group:
+                t = move_time(place_x - x, place_y - y, velocity, acceleration)
+                total += t + p.place_time
+                if report is not None:
+                    report.stages['travel to board'] += t
+                    report.stages['place'] += p.place_time
+                (x, y) = (place_x, place_y)
+
+        return total
+
+    def estimate(self, order=None):
+        # Total time in s for the given order (list of indexes in self.components), default: EComponent order
+        if order is None:
+            order = range(len(self.placements))
+        return self._run(order, None)
+
+    def simulate(self, order=None):
+        # Same as estimate, with the breakdown by stage and by feeder
+        if order is None:
+            order = range(len(self.placements))
+        report = CycleTimeReport(placements=len(self.placements))
+        report.total = self._run(order, report)
+        return report
+
+
+def log_cycle_time_report(report):
+    logging.info("")
+    logging.info("Estimated cycle time: {:.1f}s for {} placements".format(report.total, report.placements))
+    for (stage, t) in report.stages.items():
+        logging.info("\t{}: {:.1f}s".format(stage, t))
+    logging.info("Busiest feeders:")
+    for (feeder_ID, t) in report.busiest_feeders():
+        logging.info("\t{}: {:.1f}s".format(feeder_ID, t))
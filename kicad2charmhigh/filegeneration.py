@@ -4,8 +4,9 @@ import datetime
 
 from .tools import stof, stoi, clear_utf8_characters, get_feeder, get_working_name
 
-def add_header(f, outfile, component_position_file):
-    d = datetime.datetime.now()
+def add_header(f, outfile, component_position_file, date=None):
+    # date: fixed date for reproducible files, default to now
+    d = date if date is not None else datetime.datetime.now()
 
     f.write("separated\n")
     f.write("FILE,{}\n".format(os.path.basename(outfile)))
@@ -106,7 +107,7 @@ def add_components(f, components, feeders, include_newskip):
                 continue # No not include NewSkip components unless explicitly asked
             cmp.place_component = False
 
-        working_name = get_working_name(cmp, feeders)
+        working_name = get_working_name(cmp, feeders, cmp.feeder_ID)
 
         # 0b.0000.0ABC
         # A = 1 = Use Vision
@@ -0,0 +1,172 @@
+import time
+import sqlite3
+import logging
+import argparse
+from collections import OrderedDict
+
+from .tools import locate_feeder_info
+
+
+class Inventory():
+    """Remaining quantity of the reels, stored in a local SQLite database.
+    A reel is identified by its feeder ID and device name.
+    """
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        # Several conversions can run at the same time: wait for the lock instead of failing
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS reels (
+            feeder_ID TEXT NOT NULL,
+            device_name TEXT NOT NULL,
+            remaining INTEGER NOT NULL,
+            updated REAL NOT NULL,
+            PRIMARY KEY (feeder_ID, device_name))""")
+
+    def stock(self):
+        # {(feeder ID, device name): remaining}
+        rows = self.connection.execute("SELECT feeder_ID, device_name, remaining FROM reels ORDER BY feeder_ID, device_name")
+        return OrderedDict(((feeder_ID, device_name), remaining) for (feeder_ID, device_name, remaining) in rows)
+
+    def set_remaining(self, feeder_ID, device_name, remaining):
+        self.connection.execute("INSERT OR REPLACE INTO reels (feeder_ID, device_name, remaining, updated) VALUES (?, ?, ?, ?)",
+            (str(feeder_ID), device_name, remaining, time.time()))
+
+    def consume(self, consumption):
+        # Subtract the quantities of a run, in a single transaction
+        # consumption: {(feeder ID, device name): quantity}
+        # The update is relative, so the runs committing at the same time don't overwrite each other.
+        # Returns {(feeder ID, device name): remaining} after the update, read in the same transaction
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.connection.executemany("UPDATE reels SET remaining = remaining - ?, updated = ? WHERE feeder_ID = ? AND device_name = ?",
+                [(quantity, now, feeder_ID, device_name) for ((feeder_ID, device_name), quantity) in consumption.items()])
+            remaining = OrderedDict()
+            for (feeder_ID, device_name) in consumption:
+                row = self.connection.execute("SELECT remaining FROM reels WHERE feeder_ID = ? AND device_name = ?", (feeder_ID, device_name)).fetchone()
+                if row is not None:
+                    remaining[(feeder_ID, device_name)] = row[0]
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+        return remaining
+
+    def close(self):
+        self.connection.close()
+
+
+def reel_key(feeder):
+    return (str(feeder.feeder_ID), feeder.device_name)
+
+
+class InventoryRun():
+    """Reel quantities seen by one conversion: the stock read at the beginning of the run
+    minus the placements of the previous jobs. Written back with commit().
+    """
+    def __init__(self, inventory, board_quantity=1):
+        self.inventory = inventory
+        self.board_quantity = board_quantity
+        self.stock = inventory.stock()
+        self.consumption = OrderedDict()
+
+    def available(self, feeder):
+        # Remaining components on the reel of this feeder, None if it is not tracked
+        key = reel_key(feeder)
+        if key not in self.stock:
+            return None
+        return self.stock[key] - self.consumption.get(key, 0)
+
+    def needed(self, components, feeders, exclude=()):
+        # Components needed per feeder ID for the job (times the board quantity), locating each component name once
+        names = OrderedDict()
+        for cmp in components:
+            name = cmp.component_name()
+            if name not in names:
+                names[name] = [cmp, 0]
+            names[name][1] += 1
+
+        needed = OrderedDict()
+        for (cmp, count) in names.values():
+            feeder_ID = locate_feeder_info(cmp, feeders, exclude)
+            if feeder_ID not in ['NoMount', 'NewSkip']:
+                needed[feeder_ID] = needed.get(feeder_ID, 0) + count * self.board_quantity
+        return needed
+
+    def check_job(self, components, feeders, reassign=False):
+        # Warn about the reels that would run out during the job.
+        # With reassign, the components of a short reel are moved to another feeder carrying the
+        # same part (device name or alias), if that feeder has enough components left.
+        # Returns the feeder IDs to exclude when linking the components.
+        feeders_by_ID = dict((feeder.feeder_ID, feeder) for feeder in feeders)
+        exclude = set()
+        needed = self.needed(components, feeders)
+
+        for (feeder_ID, quantity) in needed.items():
+            feeder = feeders_by_ID[feeder_ID]
+            available = self.available(feeder)
+            if available is None or quantity <= available or not feeder.place_component:
+                continue
+
+            logging.warning("Feeder {} ({}): {} components needed, {} left on the reel".format(feeder_ID, feeder.device_name, quantity, available))
+            if not reassign:
+                continue
+
+            # Where would the components go without this feeder?
+            moved = self.needed(components, feeders, exclude | {feeder_ID})
+            targets = [ID for ID in moved if moved[ID] > needed.get(ID, 0)]
+            if targets and all(self.available(feeders_by_ID[ID]) is not None
+                    and moved[ID] <= self.available(feeders_by_ID[ID]) for ID in targets):
+                exclude.add(feeder_ID)
+                needed = moved
+                logging.warning("Feeder {} ({}): components moved to feeder {}".format(feeder_ID, feeder.device_name, " ".join(str(ID) for ID in targets)))
+            else:
+                logging.warning("Feeder {} ({}): no other feeder with enough components".format(feeder_ID, feeder.device_name))
+
+        return exclude
+
+    def record_job(self, feeders):
+        # Add the placements of a job (count_in_design) to the consumption of the run
+        for feeder in feeders:
+            if feeder.count_in_design == 0 or feeder.feeder_ID == "NoMount" or not feeder.place_component:
+                continue
+            key = reel_key(feeder)
+            if key in self.stock:
+                self.consumption[key] = self.consumption.get(key, 0) + feeder.count_in_design * self.board_quantity
+
+    def commit(self):
+        # The runs committed since the stock was read are taken into account in the remaining quantities
+        remaining = self.inventory.consume(self.consumption)
+        logging.info("")
+        logging.info("Inventory updated ({}):".format(self.inventory.path))
+        for (key, quantity) in self.consumption.items():
+            logging.info("\tFeeder {} ({}): -{}, {} left".format(key[0], key[1], quantity, remaining.get(key, self.stock[key] - quantity)))
+
+
+def cli():
+    parser = argparse.ArgumentParser(description='Manage the kicad2charmhigh reel inventory')
+    parser.add_argument('inventory_db', type=str, help='SQLite inventory file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('list', help='List the reels and their remaining quantity')
+
+    set_parser = subparsers.add_parser('set', help='Set the remaining quantity of a reel (new reel loaded, count...)')
+    set_parser.add_argument('feeder_ID', type=str)
+    set_parser.add_argument('device_name', type=str)
+    set_parser.add_argument('remaining', type=int)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    inventory = Inventory(args.inventory_db)
+    if args.command == 'list':
+        for ((feeder_ID, device_name), remaining) in inventory.stock().items():
+            logging.info("{}\t{}\t{}".format(feeder_ID, device_name, remaining))
+    elif args.command == 'set':
+        inventory.set_remaining(args.feeder_ID, args.device_name, args.remaining)
+    inventory.close()
+
+
+if __name__ == '__main__':
+    cli()
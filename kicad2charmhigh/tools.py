@@ -17,16 +17,32 @@ def stoi(s, default=0):
     except ValueError:
         return default
 
+# Index of an optional column, found by its header name (case, spaces and underscores ignored)
+def find_column(header, names):
+    names = [n.lower().replace(' ', '').replace('_', '') for n in names]
+    for idx, title in enumerate(header):
+        if str(title).lower().replace(' ', '').replace('_', '') in names:
+            return idx
+    return None
+
+# Float value of an optional column, default 0.0
+def optional_stof(row, idx, default=0.0):
+    if idx is None or idx >= len(row):
+        return default
+    return stof(row[idx], default)
+
 def clear_utf8_characters(str):
     str = str.replace('μ','u')
     str = str.replace('Ω','Ohm')
     return str
 
 
-def get_working_name(component, feeders):
+def get_working_name(component, feeders, feeder_ID=None):
     # Given a comp ID, return the easy to read name that will be displayed in the software
     # Resolves part to any aliases that may exist
-    feeder_ID = locate_feeder_info(component, feeders)
+    # feeder_ID: feeder the component is already linked to, if any
+    if feeder_ID is None:
+        feeder_ID = locate_feeder_info(component, feeders)
 
     if feeder_ID == "NoMount": return feeder_ID
     if feeder_ID == "NewSkip": return component.component_name()
@@ -43,14 +59,17 @@ def get_feeder(feeder_ID, feeders):
     return Feeder()
 
 
-def locate_feeder_info(component, feeders):
+def locate_feeder_info(component, feeders, exclude=()):
     # Given a component ID, try to find its name in the available feeders
-    # Search the feeder list of aliases as well
+    # Search the feeder list of aliases as well, skipping the feeders in exclude
     # Returns the ID of the feeder
 
     component_name = component.component_name()
 
     for feeder in feeders:
+        if feeder.feeder_ID in exclude:
+            continue
+
         if component_name == feeder.device_name:
             return feeder.feeder_ID
 
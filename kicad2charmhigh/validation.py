@@ -0,0 +1,148 @@
+import math
+import logging
+from collections import OrderedDict
+
+
+class PlacementIssue():
+    """A problem found on the final placements: overlap, duplicate designator or out of the board."""
+    def __init__(self,
+        kind,
+        components,
+        message
+        ):
+
+        self.kind = kind
+        self.components = components
+        self.message = message
+
+    def __repr__(self):
+        return "<PlacementIssue {}: {}>".format(self.kind, self.message)
+
+
+def placement_box(cmp, size_x=0.0, size_y=0.0, tolerance=0.1):
+    # Bounding box (xmin, ymin, xmax, ymax) of a placed component
+    # The size is given in the tape orientation, the box is the bounding box of the rotated footprint.
+    # Components of unknown size are a square of tolerance, to catch the ones at the same place.
+    angle = math.radians(cmp.rotation)
+    c = abs(math.cos(angle))
+    s = abs(math.sin(angle))
+    half_x = max((size_x * c + size_y * s), tolerance) / 2
+    half_y = max((size_x * s + size_y * c), tolerance) / 2
+    return (cmp.x - half_x, cmp.y - half_y, cmp.x + half_x, cmp.y + half_y)
+
+
+def cells(box, cell):
+    # Grid cells (cx, cy) covered by a box
+    (xmin, ymin, xmax, ymax) = box
+    return [(cx, cy)
+        for cx in range(int(math.floor(xmin / cell)), int(math.floor(xmax / cell)) + 1)
+        for cy in range(int(math.floor(ymin / cell)), int(math.floor(ymax / cell)) + 1)]
+
+
+def find_overlaps(boxes):
+    # Return the pairs of indexes (i, j), i < j, of the boxes that overlap.
+    # The boxes are hashed on a hierarchy of uniform grids: the first level cell is twice the
+    # median box size, each next level is 4 times coarser. A box goes to the first level whose
+    # cell is at least its size, so it covers at most 4 cells, and a few big footprints
+    # (connectors...) don't fill the fine grid. Each box is then compared to the boxes sharing
+    # a cell on its level and on the coarser ones: near linear, whatever the box sizes.
+    if len(boxes) < 2:
+        return []
+
+    sizes = [max(b[2] - b[0], b[3] - b[1]) for b in boxes]
+    base = 2 * max(sorted(sizes)[len(sizes) // 2], 1e-3)
+
+    # {level: (cell size, {cell: [indexes]})}
+    levels = {}
+    box_levels = []
+    for (idx, box) in enumerate(boxes):
+        level = 0
+        cell = base
+        while sizes[idx] > cell:
+            level += 1
+            cell *= 4
+        box_levels.append(level)
+        grid = levels.setdefault(level, (cell, {}))[1]
+        (xmin, ymin, xmax, ymax) = box
+        for cx in range(int(math.floor(xmin / cell)), int(math.floor(xmax / cell)) + 1):
+            for cy in range(int(math.floor(ymin / cell)), int(math.floor(ymax / cell)) + 1):
+                grid.setdefault((cx, cy), []).append(idx)
+
+    pairs = set()
+    for (level, (cell, grid)) in levels.items():
+        # Boxes of the same level sharing a cell
+        for indexes in grid.values():
+            for (n, i) in enumerate(indexes):
+                a = boxes[i]
+                for j in indexes[n + 1:]:
+                    b = boxes[j]
+                    # Strict inequalities: footprints touching each other are fine
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        pairs.add((i, j))
+
+        # Smaller boxes against the boxes of this level
+        for (i, a) in enumerate(boxes):
+            if box_levels[i] >= level:
+                continue
+            for key in cells(a, cell):
+                for j in grid.get(key, ()):
+                    b = boxes[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        pairs.add((min(i, j), max(i, j)))
+
+    return sorted(pairs)
+
+
+def board_bounds(board_size, offset, mirror_x, board_width):
+    # Board area in the placement coordinates, following the transformations of link_components
+    (width, height) = board_size
+    xmin = offset[0]
+    if mirror_x:
+        xmin = board_width - offset[0] - width
+    return (xmin, offset[1], xmin + width, offset[1] + height)
+
+
+def validate_placements(placements, tolerance=0.1, bounds=None):
+    # Check the final placements
+    # placements: list of (PartPlacement, Feeder or None)
+    # bounds: (xmin, ymin, xmax, ymax) of the board, None to skip the check
+    # Returns the list of PlacementIssue
+    issues = []
+
+    designators = OrderedDict()
+    for (cmp, _) in placements:
+        designators.setdefault(cmp.designator, []).append(cmp)
+    for (designator, cmps) in designators.items():
+        if len(cmps) > 1:
+            issues.append(PlacementIssue("duplicate", cmps, "{} is placed {} times".format(designator, len(cmps))))
+
+    boxes = []
+    for (cmp, feeder) in placements:
+        if feeder is not None:
+            boxes.append(placement_box(cmp, feeder.footprint_size_x or feeder.component_size_x, feeder.footprint_size_y or feeder.component_size_y, tolerance))
+        else:
+            boxes.append(placement_box(cmp, tolerance=tolerance))
+
+    for (i, j) in find_overlaps(boxes):
+        a = placements[i][0]
+        b = placements[j][0]
+        issues.append(PlacementIssue("overlap", [a, b], "{} ({:.3f}, {:.3f}) overlaps {} ({:.3f}, {:.3f})".format(
+            a.designator, a.x, a.y, b.designator, b.x, b.y)))
+
+    if bounds is not None:
+        (xmin, ymin, xmax, ymax) = bounds
+        for (cmp, _) in placements:
+            if not (xmin <= cmp.x <= xmax and ymin <= cmp.y <= ymax):
+                issues.append(PlacementIssue("outside", [cmp], "{} ({:.3f}, {:.3f}) is outside of the board".format(
+                    cmp.designator, cmp.x, cmp.y)))
+
+    return issues
+
+
+def log_placement_issues(issues):
+    logging.info("")
+    logging.info("Placement check:")
+    if not issues:
+        logging.info("No overlapping, duplicated or out of board placements")
+    for issue in issues:
+        logging.warning(issue.message)
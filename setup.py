@@ -9,11 +9,15 @@ def read(fname):
     return open(os.path.join(os.path.dirname(__file__), fname)).read()
 
 
-requirements = ['pyexcel', 'pyexcel-odsr', 'pyexcel-xls']
+# Read the version without importing the package (and its dependencies)
+version = {}
+exec(read(os.path.join('kicad2charmhigh', 'version.py')), version)
+
+requirements = ['pyexcel', 'pyexcel-odsr', 'pyexcel-xls', 'pyexcel-xlsx']
 
 setup(
     name = "kicad2charmhigh",
-    version = "0.0.1",
+    version = version['__version__'],
     
     packages=find_packages(),
     include_package_data=True,
@@ -21,6 +25,8 @@ setup(
     entry_points={
         'console_scripts': [
             'kicad2charmhigh=kicad2charmhigh.convert:cli',
+            'kicad2charmhigh-cache=kicad2charmhigh.cache:cli',
+            'kicad2charmhigh-inventory=kicad2charmhigh.inventory:cli',
         ],
     },
 